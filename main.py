@@ -1,28 +1,32 @@
-import time
+import logging
 import signal
+import socket
 import traceback
 import threading
 from typing import List
 import datetime
 from wxhook import Bot
-from wxhook.logger import WxLogger
 from wxhook.message_handler import MessageHandler
 from wxhook.contact_handler import ContactHandler
 from wxhook.thread_pool import ThreadPoolManager
 from wxhook.bot_handler import BotHandler
 
-logger = WxLogger.get_logger()
+logger = logging.getLogger('wxhook')
 
 class WeChatBot:
     def __init__(self):
         self.handler = BotHandler()
         self.running = True
+        self._stop_event = threading.Event()
+        self._wakeup_reader = None
+        self._wakeup_writer = None
         self.setup_signal_handlers()
 
     def handle_signal(self, signum, frame):
         """处理退出信号"""
         logger.info("\n接收到退出信号")
         self.running = False
+        self._stop_event.set()
         self.handler.cleanup()
 
     def setup_signal_handlers(self):
@@ -32,6 +36,18 @@ class WeChatBot:
             signal.signal(signal.SIGTERM, self.handle_signal)
         except Exception as e:
             logger.error(f"设置信号处理器失败: {e}")
+            return
+
+        try:
+            # 信号到达时由解释器向socket写入一个字节，主循环select到后立即醒来；
+            # Windows下set_wakeup_fd只接受socket，因此不用os.pipe
+            self._wakeup_reader, self._wakeup_writer = socket.socketpair()
+            self._wakeup_reader.setblocking(False)
+            self._wakeup_writer.setblocking(False)
+            signal.set_wakeup_fd(self._wakeup_writer.fileno())
+        except Exception as e:
+            logger.warning(f"设置信号唤醒fd失败，主循环将按超时轮询: {e}")
+            self._wakeup_reader = self._wakeup_writer = None
 
     def run(self):
         """运行主程序"""
@@ -44,13 +60,7 @@ class WeChatBot:
                 return
                 
             # 等待初始化完成
-            retry_count = 0
-            while not self.handler._initialized.is_set() and retry_count < 3:
-                logger.info("等待微信初始化完成...")
-                time.sleep(2)
-                retry_count += 1
-                
-            if not self.handler._initialized.is_set():
+            if not self.handler._initialized.wait(timeout=6):
                 logger.error("微信初始化超时，程序退出")
                 return
 
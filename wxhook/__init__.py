@@ -1,3 +1,7 @@
+from .logger import configure_logging
+
+configure_logging()
+
 from .core import Bot
 
 version = "0.0.11"
@@ -1,14 +1,15 @@
+import logging
 import time
+import select
 import threading
 import datetime
 from typing import Optional, List, Tuple
-from .logger import WxLogger
 from wxhook import Bot
 from .message_handler import MessageHandler
 from .contact_handler import ContactHandler
 from .thread_pool import ThreadPoolManager
 
-logger = WxLogger.get_logger()
+logger = logging.getLogger('wxhook')
 
 class BotHandler:
     def __init__(self):
@@ -16,10 +17,14 @@ class BotHandler:
         self.pool_manager = ThreadPoolManager()
         self.task_ids = []
         self._initialize_lock = threading.Lock()
+        # 登录成功的唯一标志，由check_login_once置位，等待方直接wait即可
         self._initialized = threading.Event()
 
     def check_login_once(self) -> bool:
         """单次检查登录状态"""
+        # 已确认登录后不再请求接口，也不会重复提交联系人获取任务
+        if self._initialized.is_set():
+            return True
         try:
             if self.bot is None:
                 logger.error("Bot未初始化")
@@ -30,6 +35,7 @@ class BotHandler:
             
             if login_response.code == 1:
                 logger.info("登录成功")
+                self._initialized.set()
                 # 异步获取联系人信息
                 self.pool_manager.submit_thread(self.fetch_and_save_contacts)
                 return True
@@ -59,14 +65,10 @@ class BotHandler:
                 
                 # 立即进行一次登录检查
                 if self.check_login_once():
-                    self._initialized.set()
                     return True
                     
                 # 如果首次检查失败,进入轮询等待
-                success = self.wait_for_login()
-                if success:
-                    self._initialized.set()
-                return success
+                return self.wait_for_login()
                 
             except Exception as e:
                 logger.error(f"初始化微信失败: {e}")
@@ -91,22 +93,14 @@ class BotHandler:
             all_contacts = self.bot.get_contacts()
             logger.info(f"总联系人数量: {len(all_contacts)}")
 
-            # 获取并保存联系人信息
-            all_contacts_data = ContactHandler.get_contact_details(self.bot, all_contacts)
-            self._save_contacts_data(all_contacts_data)
+            # 获取联系人信息，结果在获取过程中逐条写入文件
+            ContactHandler.get_contact_details(self.bot, all_contacts)
                     
         except Exception as e:
             logger.error(f"获取联系人信息时出错: {e}")
             if not isinstance(e, KeyboardInterrupt):
                 raise
 
-    def _save_contacts_data(self, contact_data: dict):
-        """保存联系人数据"""
-        try:
-            ContactHandler.save_to_json(contact_data) 
-        except Exception as e:
-            logger.error(f"保存联系人数据失败: {e}")
-
     def process_messages(self) -> bool:
         """处理消息配置"""
         if not self._initialized.is_set():
@@ -118,8 +112,7 @@ class BotHandler:
             return False
             
         try:
-            future = self.pool_manager.submit_thread(self._process_message_box)
-            self.task_ids = future.result()
+            self.task_ids = self._process_message_box()
             return bool(self.task_ids)
         except Exception as e:
             logger.error(f"处理消息配置失败: {e}")
@@ -155,18 +148,25 @@ class BotHandler:
 
     def _log_task_info(self, task_id: str, target_time: datetime.datetime, message_count: int):
         """记录任务信息"""
-        logger.info(f"\n定时任务已设置 [{task_id}]")
-        logger.info(f"将在 {target_time.strftime('%Y-%m-%d %H:%M:%S')} 发送消息")
-        logger.info(f"目标用户数: {message_count}")
+        logger.info("定时任务已设置 [%s] 将在 %s 发送消息，目标用户数: %d", task_id, target_time, message_count)
 
     def run_main_loop(self, bot_instance):
         """运行主循环"""
-        while bot_instance.running:
-            try:
-                time.sleep(0.1)  # 减少CPU使用率
-            except KeyboardInterrupt:
-                logger.info("\n接收到 Ctrl+C 信号")
-                break
+        reader = getattr(bot_instance, '_wakeup_reader', None)
+        try:
+            # 信号处理器set()后退出；有唤醒socket时select在信号到达后立即返回，
+            # 否则按秒分段等待（Windows下无超时的wait无法被Ctrl+C打断）
+            while not bot_instance._stop_event.is_set():
+                if reader is None:
+                    bot_instance._stop_event.wait(timeout=1.0)
+                    continue
+                if select.select([reader], [], [], 1.0)[0]:
+                    try:
+                        reader.recv(64)
+                    except (BlockingIOError, InterruptedError):
+                        pass
+        except KeyboardInterrupt:
+            logger.info("\n接收到 Ctrl+C 信号")
 
     def cleanup(self):
         """清理资源"""
@@ -1,164 +1,187 @@
+import logging
 import os
 import json
 import time
 import datetime
-import concurrent.futures
 from typing import Dict, List, Optional
-from tqdm import tqdm
-from colorama import init, Fore, Style
-from .logger import WxLogger
-from .model import Contact
+from .model import Contact, BasicInfo, DetailInfo, ContactRecord
 from .thread_pool import async_task
+from .json_utils import json_dumps, json_loads
+
+logger = logging.getLogger('wxhook')
+_console_initialized = False
+
+
+def _init_console() -> None:
+    """初始化colorama，只在首次同步联系人时执行一次"""
+    global _console_initialized
+    if not _console_initialized:
+        from colorama import init
+        init()
+        _console_initialized = True
 
-init()
-logger = WxLogger.get_logger()
 
 class ContactHandler:
     """联系人处理类"""
     CONTACTS_FILENAME = "contacts_data.json"  
+    CONTACTS_STREAM_FILENAME = "contacts_data.jsonl"  # 首行为汇总信息，其后每行一个联系人
+    CACHE_DIRNAME = "contacts_cache"
+    CACHE_MAX_AGE = 7 * 24 * 3600  # 单个联系人缓存有效期(秒)
     
-    @staticmethod
-    def save_to_json(data: Dict, filename: str = CONTACTS_FILENAME) -> None:
-        """保存数据到JSON文件"""
-        try:
-            os.makedirs('user_info', exist_ok=True)
-            filepath = os.path.join('user_info', filename)
-            with open(filepath, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2, cls=ContactHandler.ContactEncoder)
-            logger.info(f"数据已保存到 {filepath}")
-        except Exception as e:
-            logger.error(f"保存JSON文件失败: {e}")
-            raise
-
     @staticmethod
     def load_contacts_from_file() -> Optional[Dict]:
         """从文件加载联系人信息"""
+        filepath = None
         try:
+            stream_path = os.path.join('user_info', ContactHandler.CONTACTS_STREAM_FILENAME)
+            if os.path.exists(stream_path):
+                filepath = stream_path
+                with open(stream_path, 'r', encoding='utf-8') as f:
+                    data = json_loads(f.readline())
+                    data["contacts"] = [json_loads(line) for line in f if line.strip()]
+                logger.info(f"从 {stream_path} 加载了联系人数据")
+                return data
+
+            # 兼容旧版整体保存的JSON文件
             filepath = os.path.join('user_info', ContactHandler.CONTACTS_FILENAME)
             if os.path.exists(filepath):
                 with open(filepath, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
+                    data = json_loads(f.read())
                 logger.info(f"从 {filepath} 加载了联系人数据")
                 return data
             return None
+        except json.JSONDecodeError as e:
+            # 损坏的文件直接删除，避免之后每次启动都读取失败
+            logger.error(f"联系人数据文件已损坏，删除 {filepath}: {e}")
+            try:
+                os.remove(filepath)
+            except OSError:
+                pass
+            return None
         except Exception as e:
             logger.error(f"加载联系人数据失败: {e}")
             return None
 
     @staticmethod
-    def get_contact_details(bot, contacts: List[Contact]) -> Dict:
-        """并行获取联系人详细信息"""
+    def _cache_path(wxid: str) -> str:
+        """单个联系人缓存文件路径"""
+        return os.path.join('user_info', ContactHandler.CACHE_DIRNAME, f"{wxid}.json")
+
+    @staticmethod
+    def load_cached_contact(wxid: str, max_age: float = CACHE_MAX_AGE) -> Optional[Dict]:
+        """读取单个联系人的缓存，不存在、过期或损坏时返回None"""
+        filepath = ContactHandler._cache_path(wxid)
+        try:
+            with open(filepath, 'r', encoding='utf-8') as f:
+                cached = json_loads(f.read())
+            if time.time() - cached["fetched_at"] > max_age:
+                return None
+            return cached["record"]
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"读取联系人缓存失败 {filepath}: {e}")
+            return None
+
+    @staticmethod
+    def save_cached_contact(wxid: str, record: Dict) -> None:
+        """写入单个联系人的缓存"""
+        filepath = ContactHandler._cache_path(wxid)
+        tmp_path = filepath + ".tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(json_dumps({"fetched_at": time.time(), "record": record}))
+            os.replace(tmp_path, filepath)
+        except Exception as e:
+            logger.warning(f"写入联系人缓存失败 {filepath}: {e}")
+
+    @staticmethod
+    def get_contact_details(bot, contacts: List[Contact], max_age: float = CACHE_MAX_AGE) -> Dict:
+        """并行获取联系人详细信息并逐条写入JSONL文件
+
+        记录不在内存中累积，新获取时只返回汇总信息（总数、时间、成功/失败数），
+        需要完整列表时使用load_contacts_from_file读取
+        """
         # 首先尝试从文件加载
         existing_data = ContactHandler.load_contacts_from_file()
         if existing_data:
             logger.info("找到现有联系人数据，跳过获取过程")
             return existing_data
 
-        contact_data = {
+        header = {
             "total_contacts": len(contacts),
-            "timestamp": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "contacts": []
+            "timestamp": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         }
         
+        os.makedirs(os.path.join('user_info', ContactHandler.CACHE_DIRNAME), exist_ok=True)
+
         def process_contact(contact):
+            cached = ContactHandler.load_cached_contact(contact.wxid, max_age)
+            if cached is not None:
+                return cached
+
+            basic = BasicInfo.from_contact(contact)
             try:
-                time.sleep(0.1)
                 detail = bot.get_contact(contact.wxid)
-                return {
-                    "basic_info": {
-                        "nickname": contact.nickname,
-                        "wxid": contact.wxid,
-                        "custom_account": contact.customAccount,
-                        "pinyin": contact.pinyin,
-                        "pinyin_full": contact.pinyinAll,
-                        "type": contact.type,
-                        "verify_flag": contact.verifyFlag
-                    },
-                    "detail_info": {
-                        "account": detail.account,
-                        "head_image": detail.headImage,
-                        "nickname": detail.nickname,
-                        "remark": detail.remark,
-                        "v3": detail.v3,
-                        "wxid": detail.wxid
-                    }
-                }
+                record = ContactRecord(basic, DetailInfo.from_detail(detail)).to_dict()
+                ContactHandler.save_cached_contact(contact.wxid, record)
+                return record
             except Exception as e:
                 logger.error(f"获取用户 {contact.nickname}({contact.wxid}) 的详细信息失败: {e}")
-                return {
-                    "basic_info": {
-                        "nickname": contact.nickname,
-                        "wxid": contact.wxid,
-                        "custom_account": contact.customAccount,
-                        "pinyin": contact.pinyin,
-                        "pinyin_full": contact.pinyinAll,
-                        "type": contact.type,
-                        "verify_flag": contact.verifyFlag
-                    },
-                    "detail_info": "获取失败",
-                    "error": str(e)
-                }
-
-        def process_contacts_batch(contacts_batch, pbar):
-            """处理联系人批次"""
-            results = []
-            for contact in contacts_batch:
-                result = process_contact(contact)
-                results.append(result)
-                pbar.update(1)
-                pbar.set_description(f"处理联系人: {contact.nickname[:10]}...")
-            return results
+                return ContactRecord(basic, error=str(e)).to_dict()
+
+        stream_path = os.path.join('user_info', ContactHandler.CONTACTS_STREAM_FILENAME)
+        tmp_path = stream_path + ".tmp"
 
         try:
-            # 分批处理联系人
-            batch_size = 50
-            contact_batches = [
-                contacts[i:i + batch_size] 
-                for i in range(0, len(contacts), batch_size)
-            ]
-            
+            # 进度条、着色和线程池只在真正需要同步联系人时才导入
+            import concurrent.futures
+            from tqdm import tqdm
+            from colorama import Fore, Style
+            _init_console()
+
             total_contacts = len(contacts)
-            processed_contacts = 0
+            success_count = 0
+            fail_count = 0
             
             print(f"\n{Fore.CYAN}开始获取联系人详细信息...{Style.RESET_ALL}")
-            with tqdm(total=total_contacts, 
+            # 结果在收集线程中逐条写出，全部完成后再替换正式文件
+            with open(tmp_path, 'w', encoding='utf-8') as out, \
+                 tqdm(total=total_contacts, 
                      desc="总进度", 
                      bar_format="{l_bar}%s{bar}%s{r_bar}" % (Fore.GREEN, Style.RESET_ALL),
                      unit="联系人") as pbar:
+                out.write(json_dumps(header) + "\n")
                 
-                with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor:
-                    future_to_batch = {
-                        executor.submit(process_contacts_batch, batch, pbar): batch 
-                        for batch in contact_batches
-                    }
-                    
-                    for future in concurrent.futures.as_completed(future_to_batch):
-                        try:
-                            results = future.result()
-                            contact_data["contacts"].extend(results)
-                            processed_contacts += len(results)
-                        except Exception as e:
-                            logger.error(f"处理联系人批次时出错: {e}")
+                # 逐个联系人提交，按提交顺序取回结果；process_contact自行处理获取失败
+                with concurrent.futures.ThreadPoolExecutor(max_workers=16) as executor:
+                    for contact, result in zip(contacts, executor.map(process_contact, contacts)):
+                        if "error" in result:
+                            fail_count += 1
+                        else:
+                            success_count += 1
+                        out.write(json_dumps(result) + "\n")
+                        pbar.update(1)
+                        pbar.set_description(f"处理联系人: {contact.nickname[:10]}...")
+
+            os.replace(tmp_path, stream_path)
+            logger.info(f"数据已保存到 {stream_path}")
             
             # 显示完成信息
-            success_count = len([c for c in contact_data["contacts"] if "error" not in c])
-            fail_count = len([c for c in contact_data["contacts"] if "error" in c])
-            
             print(f"\n{Fore.GREEN}处理完成：{Style.RESET_ALL}")
             print(f"{Fore.CYAN}总联系人数：{Style.RESET_ALL}{total_contacts}")
             print(f"{Fore.GREEN}成功处理：{Style.RESET_ALL}{success_count}")
             print(f"{Fore.RED}处理失败：{Style.RESET_ALL}{fail_count}")
             print(f"\n{Fore.YELLOW}等候定时任务中.......{Style.RESET_ALL}")
 
-            return contact_data
+            return {**header, "success_count": success_count, "fail_count": fail_count}
             
         except Exception as e:
             logger.error(f"获取联系人详情时出错: {e}")
             raise
-
-    class ContactEncoder(json.JSONEncoder):
-        """自定义JSON编码器处理数据类的序列化"""
-        def default(self, obj):
-            if hasattr(obj, '__dict__'):
-                return obj.__dict__
-            return super().default(obj)
\ No newline at end of file
+        finally:
+            # 成功时临时文件已被替换；中途出错（含Ctrl+C）时删除写了一半的临时文件
+            try:
+                os.remove(tmp_path)
+            except FileNotFoundError:
+                pass
\ No newline at end of file
@@ -1,30 +1,36 @@
-import json
-import socketserver
+import logging
+import asyncio
 import typing
 import psutil
 import requests
 import concurrent.futures
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
-import time
 from typing import Optional
 from datetime import datetime
 from .model import Event, Account, Contact, ContactDetail, Room, RoomMembers, Table, DB, Response
 from .utils import WeChatManager, start_wechat_with_inject, fake_wechat_version, get_pid
-from .logger import WxLogger
+from .json_utils import json_loads
 
-logger = WxLogger.get_logger()
+logger = logging.getLogger('wxhook')
 
-class RequestHandler(socketserver.BaseRequestHandler):
-    def handle(self):
-        try:
-            data = self.request.recv(1024)
-            logger.debug(f"收到请求数据: {data}")
-            self.request.sendall("200 OK".encode())
-        except Exception as e:
-            logger.error("处理请求时出错", exc_info=e)
-        finally:
-            self.request.close()
+# 供同一联系人的资料/备注请求并发使用的共享线程池
+_api_executor = concurrent.futures.ThreadPoolExecutor(
+    max_workers=16,
+    thread_name_prefix="WxApi"
+)
+
+async def handle_request(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    """处理微信回调连接，所有连接在同一个事件循环线程中处理"""
+    try:
+        data = await reader.read(1024)
+        logger.debug(f"收到请求数据: {data}")
+        writer.write("200 OK".encode())
+        await writer.drain()
+    except Exception as e:
+        logger.error("处理请求时出错", exc_info=e)
+    finally:
+        writer.close()
 
 class Bot:
     def __init__(self, faked_version: Optional[str] = None,
@@ -51,22 +57,15 @@ class Bot:
         self._event_handlers = {}
         
         try:
-            # 并行初始化关键组件
-            with concurrent.futures.ThreadPoolExecutor(max_workers=3) as executor:
-                # 初始化管理器和获取端口
-                manager_future = executor.submit(self._init_manager)
-                # 创建session可以同时进行
-                session_future = executor.submit(self._create_session)
-                
-                # 等待管理器初始化完成
-                self.wechat_manager, ports = manager_future.result()
-                self.remote_port, self.server_port = ports
-                
-                # 获取创建的session
-                self.session = session_future.result()
-                
-                # 启动微信进程
-                self.process = self._start_wechat()
+            # 创建session仅是对象构造，直接在当前线程完成
+            self.session = self._create_session()
+            
+            # 初始化管理器和获取端口
+            self.wechat_manager, ports = self._init_manager()
+            self.remote_port, self.server_port = ports
+            
+            # 启动微信进程
+            self.process = self._start_wechat()
                 
             self.BASE_URL = f"http://{self.remote_host}:{self.remote_port}"
             self.logger.info(f"API服务地址: {self.BASE_URL}")
@@ -124,19 +123,24 @@ class Bot:
         """创建具有重试机制的会话"""
         session = requests.Session()
         
-        # 配置重试策略
+        # 配置重试策略：只重试连接失败（请求尚未发出）；
+        # 接口均为POST且发送消息不幂等，读超时和5xx都不重试，避免同一条消息重复发送
         retry_strategy = Retry(
             total=3,
+            connect=3,
+            read=0,
+            status=0,
             backoff_factor=0.5,
-            status_forcelist=[500, 502, 503, 504]
+            raise_on_status=False
         )
         
-        # 配置适配器
+        # 配置适配器：只访问本机一个API地址，一个连接池即可；
+        # 池大小覆盖联系人线程+备注线程的并发，满时等待空闲连接而不是新建后丢弃
         adapter = HTTPAdapter(
             max_retries=retry_strategy,
-            pool_connections=10,
-            pool_maxsize=10,
-            pool_block=False
+            pool_connections=1,
+            pool_maxsize=32,
+            pool_block=True
         )
         
         # 注册适配器
@@ -178,31 +182,33 @@ class Bot:
             self.logger.error("获取联系人列表失败", exc_info=e)
             raise
 
+    def _get_contact_remark(self, wxid: str) -> str:
+        """获取联系人备注，失败时返回空字符串"""
+        try:
+            remark_data = {
+                "wxid": wxid,
+                "type": 1
+            }
+            remark_info = self.call_api("/api/getContactRemark", json=remark_data)
+            self.logger.debug(f"获取到的备注信息: {remark_info}")
+            if remark_info.get("code") == 1 and remark_info.get("data"):
+                remark = remark_info["data"].get("remark", "")
+                if isinstance(remark, dict) and "remark" in remark:
+                    return remark["remark"]
+                return remark
+            return ""
+        except Exception as e:
+            self.logger.error(f"获取用户备注失败: {e}")
+            return ""
+
     def get_contact(self, wxid: str) -> ContactDetail:
         """获取联系人详情"""
         try:
+            # 备注请求与资料请求并发发出
+            remark_future = _api_executor.submit(self._get_contact_remark, wxid)
             data = {"wxid": wxid}
             contact_info = self.call_api("/api/getContactProfile", json=data)["data"]
-            
-            try:
-                remark_data = {
-                    "wxid": wxid,
-                    "type": 1
-                }
-                remark_info = self.call_api("/api/getContactRemark", json=remark_data)
-                if remark_info.get("code") == 1 and remark_info.get("data"):
-                    remark = remark_info["data"].get("remark", "")
-                    if isinstance(remark, dict) and "remark" in remark:
-                        contact_info["remark"] = remark["remark"]
-                    else:
-                        contact_info["remark"] = remark
-                else:
-                    contact_info["remark"] = ""
-                    
-                self.logger.debug(f"获取到的备注信息: {remark_info}")
-            except Exception as e:
-                self.logger.error(f"获取用户备注失败: {e}")
-                contact_info["remark"] = ""
+            contact_info["remark"] = remark_future.result()
             
             return ContactDetail(**contact_info)
         except Exception as e:
@@ -210,32 +216,23 @@ class Bot:
             raise
 
     def call_api(self, api: str, *args, **kwargs) -> dict:
-        """调用API接口"""
-        max_retries = 3
-        retry_delay = 1
-        last_error = None
-        
-        for attempt in range(max_retries):
-            try:
-                self.logger.debug(f"调用API: {api}, 参数: {kwargs}")
-                response = self.session.request(
-                    "POST", 
-                    self.BASE_URL + api, 
-                    *args, 
-                    **kwargs,
-                    timeout=10
-                )
-                response_data = response.json()
-                self.logger.debug(f"API返回: {response_data}")
-                return response_data
-            except Exception as e:
-                last_error = e
-                self.logger.error(f"API调用失败 {api} (尝试 {attempt + 1}/{max_retries})", exc_info=e)
-                if attempt < max_retries - 1:
-                    time.sleep(retry_delay * (attempt + 1))
-                    continue
-        
-        raise last_error or Exception(f"API调用失败: {api}")
+        """调用API接口，重试由session适配器上的Retry策略负责"""
+        try:
+            self.logger.debug(f"调用API: {api}, 参数: {kwargs}")
+            response = self.session.request(
+                "POST", 
+                self.BASE_URL + api, 
+                *args, 
+                **kwargs,
+                timeout=10
+            )
+            # 直接解析原始字节，安装了orjson时省去先解码为str再解析的一次拷贝
+            response_data = json_loads(response.content)
+            self.logger.debug(f"API返回: {response_data}")
+            return response_data
+        except Exception as e:
+            self.logger.error(f"API调用失败 {api}", exc_info=e)
+            raise
 
     def handle(self, event_type: int):
         """事件处理装饰器"""
@@ -263,16 +260,18 @@ class Bot:
         except Exception as e:
             self.logger.error("事件处理过程出错", exc_info=e)
 
+    async def _serve(self):
+        """启动并持续运行消息服务器"""
+        server = await asyncio.start_server(handle_request, self.server_host, self.server_port)
+        self.logger.info(f"监听地址: {self.server_host}:{self.server_port}")
+        async with server:
+            await server.serve_forever()
+
     def run(self):
         """运行Bot"""
         try:
             self.logger.info("启动消息服务器...")
-            server = socketserver.ThreadingTCPServer(
-                (self.server_host, self.server_port), 
-                RequestHandler
-            )
-            self.logger.info(f"监听地址: {self.server_host}:{self.server_port}")
-            server.serve_forever()
+            asyncio.run(self._serve())
         except Exception as e:
             self.logger.error("运行服务器时出错", exc_info=e)
             raise
@@ -0,0 +1,31 @@
+import json
+import dataclasses
+from typing import Any, Union
+
+try:
+    import orjson
+except ImportError:  # orjson为可选依赖，未安装时使用标准库json
+    orjson = None
+
+
+def _json_default(obj):
+    """序列化数据类等自定义对象"""
+    if dataclasses.is_dataclass(obj):
+        return dataclasses.asdict(obj)
+    if hasattr(obj, '__dict__'):
+        return obj.__dict__
+    raise TypeError(f"无法序列化的类型: {type(obj).__name__}")
+
+
+def json_dumps(obj: Any) -> str:
+    """序列化为紧凑的JSON字符串，优先使用orjson"""
+    if orjson is not None:
+        return orjson.dumps(obj, default=_json_default).decode('utf-8')
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=_json_default)
+
+
+def json_loads(data: Union[str, bytes]) -> Any:
+    """解析JSON字符串或UTF-8字节，优先使用orjson；解析失败均抛出json.JSONDecodeError"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
@@ -1,107 +1,193 @@
 import os
+import re
+import time
+import queue
+import atexit
 import logging
+import threading
 from datetime import datetime
 from pathlib import Path
-from logging.handlers import RotatingFileHandler, TimedRotatingFileHandler
-from typing import Optional
+from logging.handlers import (RotatingFileHandler, TimedRotatingFileHandler,
+                              MemoryHandler, QueueHandler, QueueListener)
+from typing import List, Optional
 
-class WxLogger:
-    _instance = None
-    _initialized = False
-    
-    def __new__(cls):
-        if cls._instance is None:
-            cls._instance = super().__new__(cls)
-        return cls._instance
-    
-    def __init__(self):
-        if not WxLogger._initialized:
-            self.setup_logger()
-            WxLogger._initialized = True
-    
-    def setup_logger(self):
-        """设置日志配置"""
-        # 创建日志目录
-        log_dir = Path(__file__).parent.parent / 'logs'
-        log_dir.mkdir(exist_ok=True)
-        
-        # 生成日志文件名
-        current_date = datetime.now().strftime('%Y%m%d')
-        log_file = log_dir / f'wxhook_{current_date}.log'
-        
-        # 创建logger
-        self.logger = logging.getLogger('wxhook')
-        
-        # 如果logger已经有处理器，说明已经初始化过，直接返回
-        if self.logger.handlers:
+# 日志文件名：wxhook_YYYYMMDD.log，按天轮转后追加 .YYYY-MM-DD 后缀
+_LOG_FILENAME_RE = re.compile(r'wxhook_(\d{8})\.log(?:\.(\d{4}-\d{2}-\d{2}))?$')
+
+class _SecondCachedFormatter(logging.Formatter):
+    """同一秒内的记录复用已格式化的时间字符串"""
+    def __init__(self, fmt=None, datefmt=None):
+        super().__init__(fmt, datefmt)
+        self._time_cache = (None, '')
+
+    def formatTime(self, record, datefmt=None):
+        second = int(record.created)
+        cached_second, cached_str = self._time_cache
+        if cached_second != second:
+            cached_str = super().formatTime(record, datefmt)
+            # 元组整体赋值，多线程下不会读到半更新的缓存
+            self._time_cache = (second, cached_str)
+        return cached_str
+
+
+class _BufferedTimedRotatingFileHandler(TimedRotatingFileHandler):
+    """使用64KB缓冲写日志文件，只在ERROR及以上、缓冲区满或关闭时落盘"""
+    BUFFER_SIZE = 65536
+
+    def _open(self):
+        # FileHandler.errors是Python 3.9新增的属性，3.8下没有
+        return open(self.baseFilename, self.mode, buffering=self.BUFFER_SIZE,
+                    encoding=self.encoding, errors=getattr(self, 'errors', None))
+
+    def close(self):
+        super().close()
+        # 3.8的FileHandler没有该标志，自行记录，关闭后到达的记录不再重新打开文件
+        self._closed = True
+
+    def emit(self, record):
+        # 与父类相同，但不在每条记录后flush
+        try:
+            if self.shouldRollover(record):
+                self.doRollover()
+            if self.stream is None:
+                if getattr(self, '_closed', False):
+                    return
+                self.stream = self._open()
+            self.stream.write(self.format(record) + self.terminator)
+            if record.levelno >= logging.ERROR:
+                self.flush()
+        except RecursionError:
+            raise
+        except Exception:
+            self.handleError(record)
+
+
+LOGGER_NAME = 'wxhook'
+LOG_DIR = Path(__file__).resolve().parent.parent / 'logs'  # 日志目录，导入时计算一次
+# 所有处理器共用一个格式化器
+_FORMATTER = _SecondCachedFormatter(
+    '%(asctime)s [%(levelname)s] [%(filename)s:%(lineno)d] %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S'
+)
+
+_configure_lock = threading.Lock()
+_configured = False
+_listener: Optional[QueueListener] = None
+_sinks: List[logging.Handler] = []
+
+
+def _log_file_for_today() -> Path:
+    """当天的日志文件路径"""
+    return LOG_DIR / f"wxhook_{datetime.now().strftime('%Y%m%d')}.log"
+
+
+def configure_logging() -> None:
+    """配置wxhook日志，只在第一次调用时生效"""
+    global _configured, _listener, _sinks
+    with _configure_lock:
+        if _configured:
             return
-            
-        self.logger.setLevel(logging.INFO)
-        
-        # 设置日志格式
-        formatter = logging.Formatter(
-            '%(asctime)s [%(levelname)s] [%(filename)s:%(lineno)d] %(message)s',
-            datefmt='%Y-%m-%d %H:%M:%S'
-        )
+        _configured = True
+
+        LOG_DIR.mkdir(exist_ok=True)
+        logger = logging.getLogger(LOGGER_NAME)
+        logger.setLevel(logging.INFO)
         
-        # 添加按时间轮转的文件处理器
-        time_handler = TimedRotatingFileHandler(
-            log_file,
+        # 按天轮转的文件处理器，同一文件只挂一个处理器，避免重复写入和轮转时争抢改名
+        time_handler = _BufferedTimedRotatingFileHandler(
+            _log_file_for_today(),
             when='midnight',
             interval=1,
             backupCount=30,
-            encoding='utf-8'
-        )
-        time_handler.setFormatter(formatter)
-        self.logger.addHandler(time_handler)
-        
-        # 添加按大小轮转的文件处理器
-        size_handler = RotatingFileHandler(
-            log_file,
-            maxBytes=10*1024*1024,  # 10MB
-            backupCount=5,
-            encoding='utf-8'
+            encoding='utf-8',
+            delay=True
         )
-        size_handler.setFormatter(formatter)
-        self.logger.addHandler(size_handler)
+        time_handler.setFormatter(_FORMATTER)
         
-        # 添加控制台处理器
+        # 控制台处理器，不做缓冲
         console_handler = logging.StreamHandler()
-        console_handler.setFormatter(formatter)
-        self.logger.addHandler(console_handler)
+        console_handler.setFormatter(_FORMATTER)
+
+        # 文件写入先在内存中攒批，遇到ERROR及以上立即落盘
+        _sinks = [
+            MemoryHandler(512, flushLevel=logging.ERROR, target=time_handler),
+            console_handler,
+        ]
+
+        # 调用方只负责入队，由后台线程统一写出；
+        # 信号处理函数中也会记日志，使用可重入的SimpleQueue，避免主线程put时被打断而死锁
+        log_queue = queue.SimpleQueue()
+        logger.addHandler(QueueHandler(log_queue))
+        _listener = QueueListener(log_queue, *_sinks)
+        _listener.start()
+        atexit.register(_stop_listener)
 
         # 避免日志向上层传播
-        self.logger.propagate = False
+        logger.propagate = False
+
+
+def _stop_listener() -> None:
+    """停止后台写日志线程，并把缓冲中的记录写入文件"""
+    global _listener
+    listener = _listener
+    if listener is None:
+        return
+    _listener = None
+    listener.stop()
+    for handler in _sinks:
+        handler.flush()
+        target = getattr(handler, 'target', None)
+        if target is not None:
+            target.flush()
+
+
+class WxLogger:
+    """日志维护操作的门面，日志记录直接使用logging.getLogger('wxhook')"""
+    LOG_DIR = LOG_DIR
+    _FORMATTER = _FORMATTER
+
+    def __init__(self):
+        configure_logging()
+        self.logger = logging.getLogger(LOGGER_NAME)
     
-    @classmethod
-    def get_logger(cls):
+    @staticmethod
+    def get_logger() -> logging.Logger:
         """获取logger实例"""
-        if cls._instance is None:
-            cls._instance = cls()
-        return cls._instance.logger
+        configure_logging()
+        return logging.getLogger(LOGGER_NAME)
     
     def get_log_file(self) -> Path:
-        """获取当前日志文件路径"""
-        log_dir = Path(__file__).parent.parent / 'logs'
-        current_date = datetime.now().strftime('%Y%m%d')
-        return log_dir / f'wxhook_{current_date}.log'
+        """获取当前日志文件路径，结果按分钟缓存"""
+        minute = int(time.time() // 60)
+        cached = getattr(self, '_log_file_cache', None)
+        if cached is None or cached[0] != minute:
+            current_date = datetime.now().strftime('%Y%m%d')
+            cached = (minute, self.LOG_DIR / f'wxhook_{current_date}.log')
+            self._log_file_cache = cached
+        return cached[1]
     
     def clean_old_logs(self, days: int = 30):
-        """清理指定天数之前的日志文件"""
+        """清理指定天数之前的日志文件，日期直接取自文件名"""
         try:
-            log_dir = Path(__file__).parent.parent / 'logs'
             current_time = datetime.now()
             
-            for log_file in log_dir.glob('wxhook_*.log*'):
-                try:
-                    # 获取文件的修改时间
-                    file_time = datetime.fromtimestamp(log_file.stat().st_mtime)
-                    # 如果文件超过指定天数，则删除
-                    if (current_time - file_time).days > days:
-                        log_file.unlink()
-                        self.logger.info(f"已删除旧日志文件: {log_file}")
-                except Exception as e:
-                    self.logger.error(f"删除日志文件失败: {log_file}", exc_info=e)
+            with os.scandir(self.LOG_DIR) as entries:
+                for entry in entries:
+                    match = _LOG_FILENAME_RE.match(entry.name)
+                    if not match:
+                        continue
+                    try:
+                        # 轮转后的文件以后缀日期为准，否则取文件名中的创建日期
+                        if match.group(2):
+                            file_time = datetime.strptime(match.group(2), '%Y-%m-%d')
+                        else:
+                            file_time = datetime.strptime(match.group(1), '%Y%m%d')
+                        # 如果文件超过指定天数，则删除
+                        if (current_time - file_time).days > days:
+                            os.unlink(entry.path)
+                            self.logger.info("已删除旧日志文件: %s", entry.path)
+                    except Exception as e:
+                        self.logger.error("删除日志文件失败: %s", entry.path, exc_info=e)
         except Exception as e:
             self.logger.error("清理旧日志文件时出错", exc_info=e)
 
@@ -131,11 +217,7 @@ class WxLogger:
                 backupCount=backup_count,
                 encoding='utf-8'
             )
-            formatter = logging.Formatter(
-                '%(asctime)s [%(levelname)s] [%(filename)s:%(lineno)d] %(message)s',
-                datefmt='%Y-%m-%d %H:%M:%S'
-            )
-            handler.setFormatter(formatter)
+            handler.setFormatter(self._FORMATTER)
             self.logger.addHandler(handler)
             self.logger.info(f"已添加文件处理器: {filename}")
         except Exception as e:
@@ -143,12 +225,12 @@ class WxLogger:
 
     def remove_all_handlers(self):
         """移除所有日志处理器"""
+        _stop_listener()
+        for handler in _sinks:
+            target = getattr(handler, 'target', None)
+            handler.close()
+            if target is not None:
+                target.close()
         for handler in self.logger.handlers[:]:
             handler.close()
             self.logger.removeHandler(handler)
-
-    def __del__(self):
-        """析构函数，确保处理器正确关闭"""
-        if hasattr(self, 'logger'):
-            for handler in self.logger.handlers[:]:
-                handler.close()
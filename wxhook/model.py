@@ -1,7 +1,15 @@
+import sys
+import functools
 from dataclasses import dataclass
 from typing import Optional, Any, List, Dict
 
-@dataclass
+# dataclass的slots参数需要Python 3.10+，更早的版本退回普通数据类（无__slots__）
+if sys.version_info >= (3, 10):
+    _dataclass = functools.partial(dataclass, slots=True)
+else:
+    _dataclass = dataclass
+
+@_dataclass
 class Account:
     """用户"""
     account: str  # 账号名
@@ -18,7 +26,7 @@ class Account:
     wxid: str  # 微信ID
 
 
-@dataclass
+@_dataclass
 class Contact:
     """联系人"""
     customAccount: str  # 用户自定义的账号
@@ -33,7 +41,7 @@ class Contact:
     wxid: str  # 用户的微信ID
 
 
-@dataclass
+@_dataclass
 class ContactDetail:
     """联系人详情"""
     account: str  # 用户账号，如果未设置则为空字符串
@@ -44,14 +52,14 @@ class ContactDetail:
     remark: str = ""  # 好友备注名，如果未设置则为空字符串
 
 
-@dataclass
+@_dataclass
 class Response:
     """API响应"""
     code: int
     msg: str
     data: Optional[Dict] = None
 
-@dataclass
+@_dataclass
 class Room:
     """群聊"""
     admin: str  # 管理员的用户ID，如果没有管理员则为空字符串
@@ -59,7 +67,7 @@ class Room:
     notice: str  # 聊天室公告内容，如果没有设置公告则为空字符串
     xml: str  # 聊天室相关的XML信息，通常包含聊天室的详细配置信息，如果没有则为空字符串
 
-@dataclass
+@_dataclass
 class RoomMembers:
     """群成员"""
     admin: str  # 聊天室管理员的微信ID
@@ -68,7 +76,7 @@ class RoomMembers:
     memberNickname: str  # 正在提及的成员昵称，可能包含特殊字符作为昵称的一部分
     members: str  # 聊天室成员的微信ID列表，各ID之间使用特定字符分隔
     
-@dataclass
+@_dataclass
 class Table:
     """表结构"""
     name: str  # 任务名称
@@ -76,7 +84,7 @@ class Table:
     sql: str  # SQL 创建表的语句
     tableName: str  # 表名称
 
-@dataclass
+@_dataclass
 class DB:
     """数据库"""
     databaseName: str  # 数据库名称
@@ -84,10 +92,79 @@ class DB:
     tables: List[Table]  # 表列表
 
 
-@dataclass
+@_dataclass(frozen=True)
 class Event:
     """消息事件"""
     content: Optional[Any] = None
     fromUser: Optional[str] = None
     toUser: Optional[str] = None
-    type: Optional[int] = None
\ No newline at end of file
+    type: Optional[int] = None
+
+@_dataclass
+class BasicInfo:
+    """联系人基础信息（保存到本地的字段）"""
+    nickname: str  # 用户的昵称
+    wxid: str  # 用户的微信ID
+    custom_account: str  # 用户自定义的账号
+    pinyin: str  # 用户昵称的拼音首字母
+    pinyin_full: str  # 用户昵称的完整拼音
+    type: int  # 联系人类型
+    verify_flag: int  # 验证标志
+
+    @classmethod
+    def from_contact(cls, contact: Contact) -> "BasicInfo":
+        return cls(contact.nickname, contact.wxid, contact.customAccount, contact.pinyin,
+                   contact.pinyinAll, contact.type, contact.verifyFlag)
+
+    def to_dict(self) -> Dict:
+        """转换为保存格式，直接构造字典，不经过asdict的递归深拷贝"""
+        return {
+            "nickname": self.nickname,
+            "wxid": self.wxid,
+            "custom_account": self.custom_account,
+            "pinyin": self.pinyin,
+            "pinyin_full": self.pinyin_full,
+            "type": self.type,
+            "verify_flag": self.verify_flag,
+        }
+
+
+@_dataclass
+class DetailInfo:
+    """联系人详细信息（保存到本地的字段）"""
+    account: str  # 用户账号
+    head_image: str  # 头像图片URL
+    nickname: str  # 用户昵称
+    remark: str  # 好友备注名
+    v3: str  # 用户的V3信息
+    wxid: str  # 用户的微信ID
+
+    @classmethod
+    def from_detail(cls, detail: ContactDetail) -> "DetailInfo":
+        return cls(detail.account, detail.headImage, detail.nickname,
+                   detail.remark, detail.v3, detail.wxid)
+
+    def to_dict(self) -> Dict:
+        """转换为保存格式，直接构造字典，不经过asdict的递归深拷贝"""
+        return {
+            "account": self.account,
+            "head_image": self.head_image,
+            "nickname": self.nickname,
+            "remark": self.remark,
+            "v3": self.v3,
+            "wxid": self.wxid,
+        }
+
+
+@_dataclass
+class ContactRecord:
+    """单个联系人的保存记录"""
+    basic_info: BasicInfo
+    detail_info: Optional[DetailInfo] = None  # 获取失败时为None
+    error: Optional[str] = None  # 获取失败的原因
+
+    def to_dict(self) -> Dict:
+        """转换为保存格式，获取失败时detail_info记为"获取失败"并附带error"""
+        if self.error is None:
+            return {"basic_info": self.basic_info.to_dict(), "detail_info": self.detail_info.to_dict()}
+        return {"basic_info": self.basic_info.to_dict(), "detail_info": "获取失败", "error": self.error}
@@ -1,9 +1,12 @@
-import time
+import logging
+import heapq
+import itertools
 import threading
 import datetime
-from typing import Dict, List, Callable
-from dataclasses import dataclass
-from queue import Queue
+from typing import Dict, List, Callable, Tuple
+from dataclasses import dataclass, field
+
+logger = logging.getLogger('wxhook')
 
 @dataclass
 class ScheduledTask:
@@ -15,17 +18,26 @@ class ScheduledTask:
     kwargs: dict  # 函数关键字参数
     repeat: bool = False  # 是否重复
     interval: int = 0  # 重复间隔(秒)
-    status: str = 'pending'  # 任务状态：pending/running/completed/failed
+    status: str = 'pending'  # 任务状态：pending/running/completed/failed/cancelled
+    done: threading.Event = field(default_factory=threading.Event)  # 任务结束（含取消）时置位
 
 class MessageScheduler:
     """消息调度器"""
+    MAX_RESULTS = 10000  # 最多保留的已完成任务结果数
+
     def __init__(self):
-        self.tasks: List[ScheduledTask] = []
+        # 按(计划时间, 序号)排列的最小堆，序号保证同一时间的任务按添加顺序执行
+        self.tasks: List[Tuple[datetime.datetime, int, ScheduledTask]] = []
+        self._seq = itertools.count()
         self.running = False
         self.thread = None
         self.lock = threading.Lock()
-        self.task_results = Queue()
-        self.task_counter = 0
+        self._cv = threading.Condition(self.lock)
+        # 尚未结束的任务（等待中或执行中），按ID索引
+        self._active: Dict[str, ScheduledTask] = {}
+        # 已完成任务的结果，按完成顺序保存，超出上限时丢弃最早的
+        self._results: Dict[str, dict] = {}
+        self.task_counter = itertools.count(1)
 
     def start(self):
         """启动调度器"""
@@ -34,20 +46,21 @@ class MessageScheduler:
             self.thread = threading.Thread(target=self._run)
             self.thread.daemon = True
             self.thread.start()
-            print("调度器已启动")
+            logger.info("调度器已启动")
 
     def stop(self):
         """停止调度器"""
         if self.running:
-            self.running = False
+            with self._cv:
+                self.running = False
+                self._cv.notify()
             if self.thread:
                 self.thread.join()
-                print("调度器已停止")
+                logger.info("调度器已停止")
 
     def _generate_task_id(self) -> str:
         """生成唯一任务ID"""
-        self.task_counter += 1
-        return f"task_{self.task_counter}"
+        return f"task_{next(self.task_counter)}"
 
     def add_task(self, 
                  scheduled_time: datetime.datetime, 
@@ -57,7 +70,7 @@ class MessageScheduler:
                  interval: int = 0, 
                  **kwargs) -> str:
         """添加定时任务，返回任务ID"""
-        with self.lock:
+        with self._cv:
             task_id = self._generate_task_id()
             scheduled_task = ScheduledTask(
                 id=task_id,
@@ -69,8 +82,11 @@ class MessageScheduler:
                 interval=interval,
                 status='pending'
             )
-            self.tasks.append(scheduled_task)
-            print(f"已添加定时任务 [{task_id}]: 计划执行时间 {scheduled_time}")
+            heapq.heappush(self.tasks, (scheduled_time, next(self._seq), scheduled_task))
+            self._active[task_id] = scheduled_task
+            # 新任务可能早于当前等待的任务，唤醒调度线程重新计算等待时间
+            self._cv.notify()
+            logger.info("已添加定时任务 [%s]: 计划执行时间 %s", task_id, scheduled_time)
             
         if not self.running:
             self.start()
@@ -80,7 +96,7 @@ class MessageScheduler:
     def _execute_task(self, task: ScheduledTask):
         """执行任务并处理结果"""
         try:
-            print(f"开始执行任务 [{task.id}]")
+            logger.info("开始执行任务 [%s]", task.id)
             task.status = 'running'
             start_time = datetime.datetime.now()
             
@@ -90,96 +106,112 @@ class MessageScheduler:
             execution_time = (end_time - start_time).total_seconds()
             
             task.status = 'completed'
-            self.task_results.put({
+            self._save_result({
                 'task_id': task.id,
                 'status': 'completed',
                 'execution_time': execution_time,
                 'result': result
             })
-            print(f"任务 [{task.id}] 执行完成，耗时: {execution_time:.2f}秒")
+            logger.info("任务 [%s] 执行完成，耗时: %.2f秒", task.id, execution_time)
             
         except Exception as e:
             task.status = 'failed'
-            self.task_results.put({
+            self._save_result({
                 'task_id': task.id,
                 'status': 'failed',
                 'error': str(e)
             })
-            print(f"任务 [{task.id}] 执行失败: {e}")
+            logger.error("任务 [%s] 执行失败: %s", task.id, e)
+        finally:
+            with self.lock:
+                self._active.pop(task.id, None)
+            task.done.set()
+
+    def _save_result(self, result: dict):
+        """保存任务结果"""
+        with self.lock:
+            self._save_result_locked(result)
+
+    def _save_result_locked(self, result: dict):
+        """保存任务结果，调用方需持有self.lock"""
+        self._results[result['task_id']] = result
+        if len(self._results) > self.MAX_RESULTS:
+            del self._results[next(iter(self._results))]
 
     def _run(self):
-        """运行调度器主循环"""
-        while self.running:
-            now = datetime.datetime.now()
-            
-            with self.lock:
-                tasks_to_remove = []
-                tasks_to_add = []
+        """运行调度器主循环，空闲时阻塞到最近一个任务的计划时间"""
+        with self._cv:
+            while self.running:
+                now = datetime.datetime.now()
                 
-                for task in self.tasks:
-                    if task.status == 'pending' and task.time <= now:
-                        # 在新线程中执行任务
-                        thread = threading.Thread(
-                            target=self._execute_task,
-                            args=(task,)
+                while self.tasks and self.tasks[0][0] <= now:
+                    _, _, task = heapq.heappop(self.tasks)
+                    if task.status != 'pending':
+                        continue
+                    
+                    # 在新线程中执行任务
+                    thread = threading.Thread(
+                        target=self._execute_task,
+                        args=(task,)
+                    )
+                    thread.start()
+                    
+                    if task.repeat and task.interval > 0:
+                        next_time = task.time + datetime.timedelta(seconds=task.interval)
+                        new_task = ScheduledTask(
+                            id=self._generate_task_id(),
+                            time=next_time,
+                            task=task.task,
+                            args=task.args,
+                            kwargs=task.kwargs,
+                            repeat=True,
+                            interval=task.interval,
+                            status='pending'
                         )
-                        thread.start()
-                        
-                        if task.repeat and task.interval > 0:
-                            next_time = task.time + datetime.timedelta(seconds=task.interval)
-                            new_task_id = self._generate_task_id()
-                            tasks_to_add.append(ScheduledTask(
-                                id=new_task_id,
-                                time=next_time,
-                                task=task.task,
-                                args=task.args,
-                                kwargs=task.kwargs,
-                                repeat=True,
-                                interval=task.interval,
-                                status='pending'
-                            ))
-                        
-                        tasks_to_remove.append(task)
-                
-                for task in tasks_to_remove:
-                    self.tasks.remove(task)
+                        heapq.heappush(self.tasks, (next_time, next(self._seq), new_task))
+                        self._active[new_task.id] = new_task
                 
-                self.tasks.extend(tasks_to_add)
-            
-            time.sleep(0.1)  # 更频繁地检查任务
+                delay = (self.tasks[0][0] - now).total_seconds() if self.tasks else None
+                self._cv.wait(timeout=delay)
 
     def get_task_status(self, task_id: str) -> dict:
         """获取任务状态"""
         with self.lock:
-            for task in self.tasks:
-                if task.id == task_id:
-                    return {
-                        'id': task.id,
-                        'status': task.status,
-                        'scheduled_time': task.time,
-                        'type': 'pending'
-                    }
-        
-        # 检查已完成的任务结果
-        while not self.task_results.empty():
-            result = self.task_results.get()
-            if result['task_id'] == task_id:
+            task = self._active.get(task_id)
+            if task is not None:
+                return {
+                    'id': task.id,
+                    'status': task.status,
+                    'scheduled_time': task.time,
+                    'type': 'pending'
+                }
+            
+            # 检查已完成的任务结果
+            result = self._results.get(task_id)
+            if result is not None:
                 return result
         
         return {'id': task_id, 'status': 'unknown'}
 
+    def cancel_task(self, task_id: str) -> bool:
+        """取消尚未执行的任务，任务留在堆中，到期出堆时跳过"""
+        with self.lock:
+            task = self._active.get(task_id)
+            if task is None or task.status != 'pending':
+                return False
+            task.status = 'cancelled'
+            del self._active[task_id]
+            self._save_result_locked({'task_id': task_id, 'status': 'cancelled'})
+        task.done.set()
+        return True
+
     def wait_for_task(self, task_id: str, timeout: float = None) -> dict:
         """等待任务完成"""
-        start_time = time.time()
-        while True:
-            status = self.get_task_status(task_id)
-            if status['status'] in ['completed', 'failed']:
-                return status
-            
-            if timeout is not None and time.time() - start_time > timeout:
-                return {'id': task_id, 'status': 'timeout'}
-            
-            time.sleep(0.1)
+        with self.lock:
+            task = self._active.get(task_id)
+        if task is not None and not task.done.wait(timeout):
+            return {'id': task_id, 'status': 'timeout'}
+        return self.get_task_status(task_id)
 
     def get_all_tasks_status(self) -> List[Dict]:
         """获取所有任务的状态"""
@@ -192,11 +224,30 @@ class MessageScheduler:
                     'repeat': task.repeat,
                     'interval': task.interval
                 }
-                for task in self.tasks
+                for _, _, task in sorted(self.tasks)
             ]
 
     def clear_tasks(self):
         """清除所有任务"""
-        with self.lock:
+        with self._cv:
+            for task in self._active.values():
+                if task.status == 'pending':
+                    task.status = 'cancelled'
+                    self._save_result_locked({'task_id': task.id, 'status': 'cancelled'})
+                    task.done.set()
+            self._active = {
+                task_id: task for task_id, task in self._active.items()
+                if task.status == 'running'
+            }
             self.tasks.clear()
-            print("所有任务已清除")
\ No newline at end of file
+            self._cv.notify()
+            logger.info("所有任务已清除")
+
+
+# 进程内共用的调度器，所有定时群发共用一个调度线程；线程在添加第一个任务时才启动
+_shared_scheduler = MessageScheduler()
+
+
+def get_shared_scheduler() -> MessageScheduler:
+    """获取进程内共用的调度器"""
+    return _shared_scheduler
@@ -1,10 +1,10 @@
+import logging
 import concurrent.futures
 from threading import Lock
 from typing import Optional
 from functools import wraps
-from .logger import WxLogger
 
-logger = WxLogger.get_logger()
+logger = logging.getLogger('wxhook')
 
 class ThreadPoolManager:
     _instance = None
@@ -22,46 +22,59 @@ class ThreadPoolManager:
                 max_workers=10,
                 thread_name_prefix="WxHook"
             )
-            self.process_pool = concurrent.futures.ProcessPoolExecutor(
-                max_workers=4
-            )
-            self.futures = []
+            # 进程池在首次提交进程任务时才创建
+            self._process_pool = None
+            self._process_pool_lock = Lock()
+            # 只保存未完成的任务，完成后由回调移除，避免无限增长
+            self.futures = set()
             self.initialized = True
             logger.info("线程池管理器已初始化")
     
+    @property
+    def process_pool(self) -> concurrent.futures.ProcessPoolExecutor:
+        """进程池，首次访问时创建"""
+        if self._process_pool is None:
+            with self._process_pool_lock:
+                if self._process_pool is None:
+                    self._process_pool = concurrent.futures.ProcessPoolExecutor(
+                        max_workers=4
+                    )
+        return self._process_pool
+    
+    def _track(self, future):
+        """记录未完成的任务"""
+        self.futures.add(future)
+        future.add_done_callback(self.futures.discard)
+    
     def submit_thread(self, fn, *args, **kwargs):
         """提交线程任务"""
         future = self.thread_pool.submit(fn, *args, **kwargs)
-        self.futures.append(future)
+        self._track(future)
         return future
     
     def submit_process(self, fn, *args, **kwargs):
         """提交进程任务"""
         future = self.process_pool.submit(fn, *args, **kwargs)
-        self.futures.append(future)
+        self._track(future)
         return future
     
     def wait_all(self):
         """等待所有任务完成"""
-        concurrent.futures.wait(self.futures)
-        self.futures.clear()
+        concurrent.futures.wait(list(self.futures))
     
     def shutdown(self):
         """关闭线程池和进程池"""
         try:
-            # 先取消所有未完成的任务
-            for future in self.futures:
-                if not future.done():
-                    future.cancel()
-            
-            # 等待所有任务完成或被取消
-            concurrent.futures.wait(self.futures, timeout=5)
-            
-            # 关闭线程池
+            # 先取消尚未开始的任务（运行中的任务cancel()无效），再关闭线程池和进程池；
+            # 不使用shutdown的cancel_futures参数，它需要Python 3.9+
+            for future in list(self.futures):
+                future.cancel()
             self.thread_pool.shutdown(wait=False)
+            if self._process_pool is not None:
+                self._process_pool.shutdown(wait=False)
             
-            # 关闭进程池
-            self.process_pool.shutdown(wait=False)
+            # 等待仍在执行的任务结束
+            concurrent.futures.wait(list(self.futures), timeout=5)
             
             logger.info("线程池管理器已关闭")
         except Exception as e:
@@ -69,15 +82,19 @@ class ThreadPoolManager:
 
 def async_task(pool_type: str = 'thread'):
     """异步任务装饰器"""
+    if pool_type not in ('thread', 'process'):
+        raise ValueError(f"不支持的池类型: {pool_type}")
+    
     def decorator(func):
+        # 首次调用时解析提交方法并缓存，避免导入时就创建线程池
+        submit = None
+        
         @wraps(func)
         def wrapper(*args, **kwargs):
-            pool_manager = ThreadPoolManager()
-            if pool_type == 'thread':
-                return pool_manager.submit_thread(func, *args, **kwargs)
-            elif pool_type == 'process':
-                return pool_manager.submit_process(func, *args, **kwargs)
-            else:
-                raise ValueError(f"不支持的池类型: {pool_type}")
+            nonlocal submit
+            if submit is None:
+                pool_manager = ThreadPoolManager()
+                submit = pool_manager.submit_thread if pool_type == 'thread' else pool_manager.submit_process
+            return submit(func, *args, **kwargs)
         return wrapper
     return decorator
\ No newline at end of file
@@ -1,85 +1,155 @@
+import re
+import logging
 import datetime
-from typing import Tuple
-from .logger import WxLogger
-from .scheduler import MessageScheduler
+import functools
+from typing import Iterable, List, Optional, Tuple
+from .scheduler import MessageScheduler, get_shared_scheduler
+
+logger = logging.getLogger('wxhook')
+
+_MessageHandler = None  # 首次定时触发时绑定，之后直接复用
+
+_CACHEABLE_TIME_STR_LEN = 32  # 超过该长度的输入不缓存，避免异常输入撑满缓存
+
+
+# [YYYY-]MM-DD HH:MM:SS 或 HH:MM:SS，一次匹配取出全部字段
+_TIME_RE = re.compile(r'(?:(?:(\d{4})-)?(\d{1,2})-(\d{1,2})\s+)?(\d{1,2}):(\d{1,2}):(\d{1,2})')
+
+
+@functools.lru_cache(maxsize=2048)
+def _parse_time_fields(time_str: str) -> Tuple[Optional[Tuple[int, ...]], Tuple[int, int, int]]:
+    """拆分时间字符串为(日期字段, 时分秒)，结果只取决于字符串本身，可以安全缓存"""
+    m = _TIME_RE.fullmatch(time_str.strip())
+    if m is None:
+        # 仅在出错时细分原因，保持原有的错误信息
+        parts = time_str.split()
+        if len(parts) not in (1, 2):
+            raise ValueError("不支持的时间格式")
+        if len(parts) == 1 or parts[-1].count(':') != 2:
+            raise ValueError("时间格式必须为 HH:MM:SS")
+        raise ValueError("不支持的日期格式")
+    
+    year, month, day, hour, minute, second = m.groups()
+    time_fields = (int(hour), int(minute), int(second))
+    if month is None:  # HH:MM:SS
+        return None, time_fields
+    if year is None:  # MM-DD
+        return (int(month), int(day)), time_fields
+    return (int(year), int(month), int(day)), time_fields
+
+
+def _get_message_handler():
+    """延迟获取MessageHandler，只在第一次调用时导入"""
+    global _MessageHandler
+    if _MessageHandler is None:
+        from .message_handler import MessageHandler
+        _MessageHandler = MessageHandler
+    return _MessageHandler
 
-logger = WxLogger.get_logger()
 
 class TimeHandler:
     @staticmethod
-    def parse_time(time_str: str) -> datetime.datetime:
-        """解析时间字符串"""
+    def parse_time(time_str: str, now: Optional[datetime.datetime] = None) -> datetime.datetime:
+        """解析时间字符串，now为判断是否顺延所用的当前时间，默认取调用时刻"""
         try:
-            now = datetime.datetime.now()
+            if now is None:
+                now = datetime.datetime.now()
             
-            if len(time_str.split()) == 1:  # HH:MM:SS
-                time_parts = time_str.split(':')
-                if len(time_parts) == 3:  # HH:MM:SS
-                    hour, minute, second = map(int, time_parts)
-                    target_time = now.replace(hour=hour, minute=minute, second=second, microsecond=0)
-                    if target_time <= now:
-                        target_time += datetime.timedelta(days=1)
-                else:
-                    raise ValueError("时间格式必须为 HH:MM:SS")
-                
-            elif len(time_str.split()) == 2:  # 完整日期和时间
-                date_part, time_part = time_str.split()
-                time_parts = time_part.split(':')
-                
-                if len(time_parts) != 3:  # 必须包含秒
-                    raise ValueError("时间格式必须为 HH:MM:SS")
-                    
-                hour, minute, second = map(int, time_parts)
+            # 最常见的"HH:MM:SS"直接按位置切片，不经过正则和缓存
+            if (len(time_str) == 8 and time_str[2] == ':' and time_str[5] == ':'
+                    and time_str[:2].isdecimal() and time_str[3:5].isdecimal()
+                    and time_str[6:].isdecimal()):
+                date_fields = None
+                hour, minute, second = int(time_str[:2]), int(time_str[3:5]), int(time_str[6:])
+            elif len(time_str) <= _CACHEABLE_TIME_STR_LEN:
+                date_fields, (hour, minute, second) = _parse_time_fields(time_str)
+            else:
+                date_fields, (hour, minute, second) = _parse_time_fields.__wrapped__(time_str)
+            
+            # 顺延到明天/明年依赖当前时间，不能缓存，每次重新计算
+            if date_fields is None:  # HH:MM:SS
+                target_time = now.replace(hour=hour, minute=minute, second=second, microsecond=0)
+                if target_time <= now:
+                    target_time += datetime.timedelta(days=1)
                 
-                if len(date_part.split('-')) == 2:  # MM-DD
-                    month, day = map(int, date_part.split('-'))
-                    target_time = now.replace(month=month, day=day, hour=hour, 
-                                            minute=minute, second=second, microsecond=0)
-                    if target_time <= now:
-                        target_time = target_time.replace(year=target_time.year + 1)
-                    
-                elif len(date_part.split('-')) == 3:  # YYYY-MM-DD
-                    year, month, day = map(int, date_part.split('-'))
-                    target_time = datetime.datetime(year, month, day, hour, minute, second)
-                    if target_time <= now:
-                        raise ValueError("完整日期时间不能早于当前时间")
+            elif len(date_fields) == 2:  # MM-DD
+                month, day = date_fields
+                target_time = now.replace(month=month, day=day, hour=hour, 
+                                        minute=minute, second=second, microsecond=0)
+                if target_time <= now:
+                    target_time = target_time.replace(year=target_time.year + 1)
                 
-                else:
-                    raise ValueError("不支持的日期格式")
+            else:  # YYYY-MM-DD
+                year, month, day = date_fields
+                target_time = datetime.datetime(year, month, day, hour, minute, second)
+                if target_time <= now:
+                    raise ValueError("完整日期时间不能早于当前时间")
             
-            else:
-                raise ValueError("不支持的时间格式")
-            
-            logger.info(f"解析时间成功: {target_time}")
+            logger.info("解析时间成功: %s", target_time)
             return target_time
             
         except Exception as e:
             logger.error("时间格式错误", exc_info=e)
             raise ValueError(f"时间格式错误: {str(e)}")
 
+    @staticmethod
+    def _make_send_job(bot, messages_dict: dict):
+        """构造定时触发时执行的群发函数"""
+        def send_scheduled_messages():
+            logger.info("开始发送定时消息")
+            # send_messages_to_multiple经async_task提交到线程池，返回Future，需等待结果
+            success_count, fail_count = _get_message_handler().send_messages_to_multiple(bot, messages_dict).result()
+            logger.info("定时发送完成！成功: %d, 失败: %d", success_count, fail_count)
+            return {'success': success_count, 'failed': fail_count}
+        return send_scheduled_messages
+
     @staticmethod
     def setup_schedule(bot, messages_dict: dict, time_str: str) -> Tuple[MessageScheduler, str, datetime.datetime]:
-        """设置定时任务"""
+        """设置定时任务，任务添加到进程内共用的调度器"""
         try:
-            target_time = TimeHandler.parse_time(time_str)
-            wait_seconds = (target_time - datetime.datetime.now()).total_seconds()
+            # 解析和计算等待时间使用同一个当前时间，避免两次取时结果不一致
+            now = datetime.datetime.now()
+            target_time = TimeHandler.parse_time(time_str, now=now)
+            wait_seconds = (target_time - now).total_seconds()
             
-            logger.info(f"\n定时设置:")
-            logger.info(f"目标时间: {target_time.strftime('%Y-%m-%d %H:%M:%S')}")
-            logger.info(f"等待时间: {wait_seconds:.0f} 秒")
+            logger.info("定时设置 - 目标时间: %s 等待时间: %.0f 秒", target_time, wait_seconds)
             
-            scheduler = MessageScheduler()
+            scheduler = get_shared_scheduler()
+            task_id = scheduler.add_task(target_time, TimeHandler._make_send_job(bot, messages_dict))
+            return scheduler, task_id, target_time
             
-            def send_scheduled_messages():
-                from .message_handler import MessageHandler
-                logger.info(f"开始发送定时消息，时间: {datetime.datetime.now()}")
-                success_count, fail_count = MessageHandler.send_messages_to_multiple(bot, messages_dict)
-                logger.info(f"定时发送完成！成功: {success_count}, 失败: {fail_count}")
-                return {'success': success_count, 'failed': fail_count}
+        except ValueError as e:
+            logger.error("时间设置错误", exc_info=e)
+            raise
+
+    @staticmethod
+    def setup_schedules(bot, messages_dict: dict, 
+                        time_strs: Iterable[str]) -> Tuple[MessageScheduler, List[Tuple[str, datetime.datetime]]]:
+        """批量设置定时任务，每个时间字符串只解析一次，解析到同一时刻的只生成一个任务
+
+        任务添加到进程内共用的调度器，返回该调度器和按输入顺序排列的(任务ID, 目标时间)列表；
+        任一时间无效时不添加任何任务
+        """
+        try:
+            now = datetime.datetime.now()
+            # 先全部解析，保证出错时不会留下部分已添加的任务；
+            # 按解析结果去重，"08:00:00"与"8:00:00"不会重复发送
+            parsed = {}
+            targets = {}
+            for time_str in time_strs:
+                if time_str not in parsed:
+                    parsed[time_str] = TimeHandler.parse_time(time_str, now=now)
+                targets[parsed[time_str]] = None
             
-            task_id = scheduler.add_task(target_time, send_scheduled_messages)
-            return scheduler, task_id, target_time
+            scheduler = get_shared_scheduler()
+            job = TimeHandler._make_send_job(bot, messages_dict)
+            scheduled = [
+                (scheduler.add_task(target_time, job), target_time)
+                for target_time in targets
+            ]
+            logger.info("已批量设置 %d 个定时任务", len(scheduled))
+            return scheduler, scheduled
             
         except ValueError as e:
             logger.error("时间设置错误", exc_info=e)
-            raise
\ No newline at end of file
+            raise
@@ -1,11 +1,19 @@
+import os
 import json
 import typing
 import pathlib
 import subprocess
 import psutil
-import threading
 from concurrent.futures import ThreadPoolExecutor
 from typing import Optional, Tuple
+from .json_utils import json_dumps, json_loads
+
+try:
+    import win32api
+    import win32con
+    import win32job
+except ImportError:  # pywin32为可选依赖，未安装时超时改为用psutil逐个结束进程树
+    win32job = None
 
 BASE_DIR = pathlib.Path(__file__).resolve().parent
 TOOLS = BASE_DIR / "tools"
@@ -13,63 +21,97 @@ DLL = TOOLS / "wxhook.dll"
 START_WECHAT = TOOLS / "start-wechat.exe"
 FAKER = TOOLS / "faker.exe"
 
+# 启动子进程时直接使用的字符串路径，导入时转换一次
+_START_WECHAT_STR = str(START_WECHAT)
+_DLL_STR = str(DLL)
+_FAKER_STR = str(FAKER)
+
 class ProcessTimeoutError(Exception):
     pass
 
-def start_wechat_with_inject(port: int) -> typing.Tuple[int, str]:
-    """启动微信进程并注入DLL"""
-    def kill_process_tree(process):
+def _creationflags() -> int:
+    """启动器的创建标志：可用作业对象时挂起创建，加入作业后再恢复运行"""
+    flags = subprocess.CREATE_NO_WINDOW  # Windows下隐藏控制台窗口
+    if win32job is not None:
+        flags |= win32con.CREATE_SUSPENDED
+    return flags
+
+def _assign_job(process: subprocess.Popen):
+    """将挂起创建的进程加入作业对象后恢复运行，超时时可一次结束整棵进程树；不可用时返回None
+
+    进程在加入作业前不会运行，它启动的微信必然也在作业内；
+    不设置JOB_OBJECT_LIMIT_KILL_ON_JOB_CLOSE，启动成功后作业句柄释放不会结束微信
+    """
+    if win32job is None:
+        return None
+    job = None
+    try:
+        job = win32job.CreateJobObject(None, "")
+        handle = win32api.OpenProcess(
+            win32con.PROCESS_SET_QUOTA | win32con.PROCESS_TERMINATE, False, process.pid
+        )
+        try:
+            win32job.AssignProcessToJobObject(job, handle)
+        finally:
+            win32api.CloseHandle(handle)
+    except Exception:
+        job = None
+    finally:
+        # 无论是否成功加入作业都要恢复运行，否则进程会一直挂起
         try:
+            psutil.Process(process.pid).resume()
+        except Exception:
+            process.kill()
+            raise
+    return job
+
+def _kill_process(process: subprocess.Popen, job=None) -> None:
+    """结束超时的进程及其子进程（如已启动的微信）：有作业对象时结束整个作业，否则用psutil逐个结束"""
+    try:
+        if job is not None:
+            win32job.TerminateJobObject(job, 1)
+        else:
             parent = psutil.Process(process.pid)
-            children = parent.children(recursive=True)
-            for child in children:
-                child.kill()
+            for child in parent.children(recursive=True):
+                try:
+                    child.kill()
+                except psutil.NoSuchProcess:
+                    pass
             parent.kill()
-        except psutil.NoSuchProcess:
-            pass
+    except Exception:
+        pass
+    try:
+        process.wait(1)
+    except subprocess.TimeoutExpired:
+        pass
 
+def start_wechat_with_inject(port: int) -> typing.Tuple[int, str]:
+    """启动微信进程并注入DLL"""
     try:
-        # 使用Popen异步启动进程
-        process = subprocess.Popen(
-            f"{START_WECHAT} {DLL} {port}",
+        # 使用Popen异步启动进程，参数以列表传入，路径含空格时也无需引号；
+        # 启动器的stderr从不使用，直接丢弃，退出with时关闭管道并回收进程
+        with subprocess.Popen(
+            [_START_WECHAT_STR, _DLL_STR, str(port)],
             stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
             text=True,
-            creationflags=subprocess.CREATE_NO_WINDOW  # Windows下隐藏控制台窗口
-        )
+            creationflags=_creationflags()
+        ) as process:
+            job = _assign_job(process)
 
-        # 设置超时时间（秒）
-        timeout = 10
-        result = {"success": False, "code": None, "output": None}
-        
-        def target():
+            # 设置超时时间（秒）
+            timeout = 10
             try:
-                stdout, stderr = process.communicate()
-                if stdout:
-                    code, output = stdout.strip().split(",")
-                    result["success"] = True
-                    result["code"] = int(code)
-                    result["output"] = output
-            except Exception as e:
-                result["error"] = str(e)
-
-        # 创建并启动线程
-        thread = threading.Thread(target=target)
-        thread.daemon = True
-        thread.start()
-        thread.join(timeout)
-
-        if thread.is_alive():
-            # 如果线程还活着，说明超时了
-            kill_process_tree(process)
-            raise ProcessTimeoutError(f"启动微信超时 (>{timeout}秒)")
-
-        if not result["success"]:
-            if "error" in result:
-                raise Exception(f"启动失败: {result['error']}")
+                stdout, _ = process.communicate(timeout=timeout)
+            except subprocess.TimeoutExpired:
+                _kill_process(process, job)
+                raise ProcessTimeoutError(f"启动微信超时 (>{timeout}秒)")
+
+        if not stdout:
             raise Exception("启动失败，未知错误")
 
-        return result["code"], result["output"]
+        code, output = stdout.strip().split(",", 1)
+        return int(code), output
 
     except ProcessTimeoutError:
         raise
@@ -80,7 +122,7 @@ def fake_wechat_version(pid: int, old_version: str, new_version: str) -> int:
     """伪装微信版本"""
     try:
         result = subprocess.run(
-            f"{FAKER} {pid} {old_version} {new_version}",
+            [_FAKER_STR, str(pid), old_version, new_version],
             capture_output=True,
             text=True,
             timeout=5  # 添加超时限制
@@ -94,122 +136,154 @@ def fake_wechat_version(pid: int, old_version: str, new_version: str) -> int:
 def get_pid(port: int) -> typing.Tuple[int, int]:
     """通过端口号获取进程ID"""
     try:
-        # 使用更可靠的方式获取进程信息
-        for conn in psutil.net_connections():
-            if conn.laddr.port == port and conn.status == 'LISTEN':
-                return 0, conn.pid
-                
-        # 如果上面方法失败，使用netstat命令作为备选方案
+        try:
+            # 只枚举TCP连接，跳过UDP和UNIX套接字
+            for conn in psutil.net_connections(kind='tcp'):
+                if conn.laddr and conn.laddr.port == port and conn.status == 'LISTEN':
+                    return 0, conn.pid
+            raise Exception(f"未找到端口 {port} 的监听进程")
+        except psutil.AccessDenied:
+            # 无权限枚举连接时才退回netstat，不经过shell
+            pass
+        
         output = subprocess.run(
-            f"netstat -ano | findStr \"{port}\"", 
+            ["netstat", "-ano"],
             capture_output=True,
             text=True,
-            shell=True,
             timeout=5  # 添加超时限制
         ).stdout
         
-        if not output:
-            raise Exception(f"未找到端口 {port} 对应的进程")
-            
-        for line in output.split('\n'):
-            if 'LISTENING' in line:
-                pid = int(line.split()[-1])
-                return 0, pid
+        # 行格式: 协议 本地地址 外部地址 状态 PID，只比对本地地址的端口，避免1900误匹配19001
+        port_str = str(port)
+        for line in output.splitlines():
+            fields = line.split()
+            if (len(fields) == 5 and fields[3] == 'LISTENING'
+                    and fields[1].rpartition(':')[2] == port_str):
+                return 0, int(fields[4])
                 
         raise Exception(f"未找到端口 {port} 的监听进程")
         
     except Exception as e:
         raise Exception(f"获取进程ID失败: {str(e)}")
 
+def _live_pids() -> typing.Set[int]:
+    """一次性枚举所有存活进程的PID，代替逐条调用psutil.pid_exists"""
+    return set(psutil.pids())
+
 class WeChatManager:
-    """微信管理器类"""
+    """微信管理器类
+
+    单写者模型：每个实例只应由创建它的线程（Bot初始化/退出流程）调用，实例内不加锁；
+    写入经临时文件原子替换，其他进程读取时不会看到写了一半的文件
+    """
     
     def __init__(self):
         self.filename = BASE_DIR / "tools" / "wxhook.json"
-        self._lock = threading.Lock()
+        # 配置文件的内存副本，文件mtime变化（如被其他进程修改）时才重新读取
+        self._cache = None
+        self._cache_mtime = -1
         self._init_file()
 
     def _init_file(self) -> None:
         """初始化配置文件"""
         try:
             if not self.filename.exists():
-                with self._lock:
-                    with open(self.filename, "w", encoding="utf-8") as file:
-                        json.dump({
-                            "increase_remote_port": 19000,
-                            "wechat": []
-                        }, file, indent=2)
+                with open(self.filename, "w", encoding="utf-8") as file:
+                    json.dump({
+                        "increase_remote_port": 19000,
+                        "wechat": []
+                    }, file, indent=2)
         except Exception as e:
             raise Exception(f"初始化配置文件失败: {str(e)}")
 
+    def _load(self) -> dict:
+        """读取配置，文件未修改时返回内存副本"""
+        mtime_ns = os.stat(self.filename).st_mtime_ns
+        if self._cache is None or mtime_ns != self._cache_mtime:
+            self._cache = json_loads(self.filename.read_bytes())
+            self._cache_mtime = mtime_ns
+        return self._cache
+
+    def _save(self, data: dict) -> None:
+        """写入配置并更新内存副本"""
+        try:
+            # 运行期频繁重写，使用紧凑格式；初始文件仍保留缩进便于查看
+            # 先写临时文件再原子替换，其他读取方不会读到截断的文件
+            tmp_path = self.filename.with_suffix(".json.tmp")
+            with open(tmp_path, "w", encoding="utf-8") as file:
+                file.write(json_dumps(data))
+            os.replace(tmp_path, self.filename)
+            self._cache = data
+            self._cache_mtime = os.stat(self.filename).st_mtime_ns
+        except Exception:
+            # 写入失败时内存副本可能已被修改，下次重新从文件读取
+            self._cache = None
+            raise
+
     def get_port(self) -> typing.Tuple[int, int]:
         """获取可用端口"""
         try:
-            with self._lock:
-                with open(self.filename, "r", encoding="utf-8") as file:
-                    data = json.load(file)
-                remote_port = data["increase_remote_port"] + 1
-                server_port = 19000 - (remote_port - 19000)
+            data = self._load()
+            remote_port = data["increase_remote_port"] + 1
+            server_port = 19000 - (remote_port - 19000)
                 
-                # 检查端口是否被占用
-                while self._is_port_in_use(remote_port) or self._is_port_in_use(server_port):
-                    remote_port += 1
-                    server_port = 19000 - (remote_port - 19000)
+            # 一次性取出已占用端口，之后只做集合查找
+            used_ports = self._used_ports()
+            while remote_port in used_ports or server_port in used_ports:
+                remote_port += 1
+                server_port = 19000 - (remote_port - 19000)
                 
-                return remote_port, server_port
+            return remote_port, server_port
         except Exception as e:
             raise Exception(f"获取端口失败: {str(e)}")
 
-    def _is_port_in_use(self, port: int) -> bool:
-        """检查端口是否被占用"""
+    @staticmethod
+    def _used_ports() -> typing.Set[int]:
+        """获取当前所有已占用的本地TCP端口"""
         try:
-            for conn in psutil.net_connections():
-                if conn.laddr.port == port:
-                    return True
-            return False
+            return {conn.laddr.port for conn in psutil.net_connections(kind='tcp') if conn.laddr}
         except:
-            return False
+            return set()
 
     def add(self, pid: int, remote_port: int, server_port: int) -> None:
         """添加微信进程记录"""
         try:
-            with self._lock:
-                with open(self.filename, "r", encoding="utf-8") as file:
-                    data = json.load(file)
+            data = self._load()
                 
-                # 清理已经不存在的进程记录
-                data["wechat"] = [
-                    w for w in data["wechat"] 
-                    if psutil.pid_exists(w["pid"])
-                ]
+            # 清理已经不存在的进程记录
+            live_pids = _live_pids()
+            data["wechat"] = [
+                w for w in data["wechat"] 
+                if w["pid"] in live_pids
+            ]
                 
-                # 添加新记录
-                data["increase_remote_port"] = remote_port
-                data["wechat"].append({
-                    "pid": pid,
-                    "remote_port": remote_port,
-                    "server_port": server_port
-                })
+            # 添加新记录
+            data["increase_remote_port"] = remote_port
+            data["wechat"].append({
+                "pid": pid,
+                "remote_port": remote_port,
+                "server_port": server_port
+            })
                 
-                with open(self.filename, "w", encoding="utf-8") as file:
-                    json.dump(data, file, indent=2)
+            self._save(data)
         except Exception as e:
             raise Exception(f"添加进程记录失败: {str(e)}")
 
     def cleanup(self):
         """清理无效的进程记录"""
         try:
-            with self._lock:
-                with open(self.filename, "r", encoding="utf-8") as file:
-                    data = json.load(file)
+            data = self._load()
                 
-                # 只保留仍在运行的进程记录
-                data["wechat"] = [
-                    w for w in data["wechat"] 
-                    if psutil.pid_exists(w["pid"])
-                ]
+            # 只保留仍在运行的进程记录
+            live_pids = _live_pids()
+            alive = [
+                w for w in data["wechat"] 
+                if w["pid"] in live_pids
+            ]
                 
-                with open(self.filename, "w", encoding="utf-8") as file:
-                    json.dump(data, file, indent=2)
+            # 没有需要清理的记录时不重写文件
+            if len(alive) != len(data["wechat"]):
+                data["wechat"] = alive
+                self._save(data)
         except Exception as e:
-            raise Exception(f"清理进程记录失败: {str(e)}")
\ No newline at end of file
+            raise Exception(f"清理进程记录失败: {str(e)}")